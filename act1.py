@@ -1,8 +1,19 @@
+import os
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime
 
+# Orden calendario para los dtypes categóricos ordenados
+ORDEN_MESES = [
+    'enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+    'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'
+]
+ORDEN_DIAS = [
+    'lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo'
+]
+
 # Configuración de la página
 st.set_page_config(
     page_title="Análisis OLAP de Ventas - CSV",
@@ -13,30 +24,160 @@ st.set_page_config(
 @st.cache_data
 def load_csv_data():
     try:
-        # Cargar directamente desde CSV
-        df = pd.read_csv('data/ventas.csv', parse_dates=['Fecha'])
-        
-        # Verificar columnas esenciales
-        required_cols = {'Fecha', 'Producto', 'Región', 'Ventas'}
-        missing = required_cols - set(df.columns)
-        if missing:
-            st.error(f"Error: Faltan columnas en el CSV: {missing}")
-            st.stop()
-        
-        # Procesamiento de fechas
-        df['Año'] = df['Fecha'].dt.year
-        df['Trimestre'] = 'T' + df['Fecha'].dt.quarter.astype(str)
-        df['Mes'] = df['Fecha'].dt.month_name(locale='Spanish')
-        df['DíaSemana'] = df['Fecha'].dt.day_name(locale='Spanish')
-        
-        return df
-    
+        # Snapshot Parquet del DataFrame enriquecido: el primer arranque
+        # tras un despliegue paga el parseo del CSV, pero cada reinicio
+        # posterior del worker lee Parquet con los dtypes exactos
+        csv_path = 'data/ventas.csv'
+        parquet_path = 'data/ventas.parquet'
+        derivadas = ['Año', 'Trimestre', 'Mes', 'DíaSemana']
+
+        df = None
+        if os.path.exists(parquet_path) and \
+                os.path.getmtime(parquet_path) > os.path.getmtime(csv_path):
+            df = pd.read_parquet(parquet_path)
+            if not set(derivadas).issubset(df.columns):
+                # Snapshot escrito con otro esquema: reconstruir del CSV
+                df = None
+
+        if df is None:
+            # Cargar directamente desde CSV con el motor PyArrow, que parsea
+            # fechas/strings en paralelo; los categóricos se fijan en la lectura
+            df = pd.read_csv(
+                csv_path,
+                engine='pyarrow', parse_dates=['Fecha'],
+                # float32 alcanza de sobra para montos de ventas y mueve la
+                # mitad de bytes en cada suma agregada
+                dtype={'Producto': 'category', 'Región': 'category',
+                       'Ventas': 'float32'}
+            )
+
+            # Verificar columnas esenciales
+            required_cols = {'Fecha', 'Producto', 'Región', 'Ventas'}
+            missing = required_cols - set(df.columns)
+            if missing:
+                st.error(f"Error: Faltan columnas en el CSV: {missing}")
+                st.stop()
+
+            # Procesamiento de fechas
+            df['Año'] = df['Fecha'].dt.year
+            # Trimestre como entero pequeño; el prefijo 'T' se pone solo al
+            # mostrar, no en los datos
+            df['Trimestre'] = df['Fecha'].dt.quarter.astype('int8')
+            # Mes/DíaSemana via tablas de 12 y 7 entradas en lugar de
+            # month_name/day_name(locale=...), que llaman al locale por fila
+            df['Mes'] = pd.Categorical.from_codes(
+                df['Fecha'].dt.month.to_numpy() - 1,
+                categories=ORDEN_MESES, ordered=True
+            )
+            df['DíaSemana'] = pd.Categorical.from_codes(
+                df['Fecha'].dt.weekday.to_numpy(),
+                categories=ORDEN_DIAS, ordered=True
+            )
+
+            # Orden temporal + Año como índice: df.loc[[año]] usa el motor
+            # de índices de pandas en lugar de escanear las N filas con una
+            # máscara. El nombre del índice se limpia para no chocar con la
+            # columna Año
+            df = df.sort_values('Fecha').set_index('Año', drop=False)
+            df.index.name = None
+
+            df.to_parquet(parquet_path, compression='zstd')
+
+        # Cuboide base Año×Trimestre×Mes×Producto×Región: se agrega la
+        # tabla completa una sola vez y los roll-ups derivan de su índice
+        cuboid = df.groupby(
+            ['Año', 'Trimestre', 'Mes', 'Producto', 'Región'], observed=True
+        )['Ventas'].sum()
+
+        cubes = {
+            'cuboid': cuboid,
+            'year': cuboid.groupby(level='Año').sum(),
+            'year_month': cuboid.groupby(level=['Año', 'Mes'], observed=True).sum(),
+            'product_region': cuboid.groupby(level=['Producto', 'Región'], observed=True).sum().unstack(),
+            'month_total': cuboid.groupby(level='Mes', observed=True).sum(),
+        }
+
+        # Valores únicos para los widgets, calculados una sola vez; las
+        # tuplas son hashables y abaratan las claves de caché
+        meta = {
+            'regions': tuple(df['Región'].cat.categories),
+            'products': tuple(df['Producto'].cat.categories),
+            'years': tuple(sorted(df['Año'].unique(), reverse=True)),
+        }
+
+        return df, cubes, meta
+
     except Exception as e:
         st.error(f"Error cargando CSV: {str(e)}")
         st.stop()
 
 # Cargar datos
-df = load_csv_data()
+df, cubes, meta = load_csv_data()
+
+# Filtrado y agregados derivados memoizados por selección: tocar un
+# widget no relacionado no vuelve a escanear el DataFrame completo
+@st.cache_data
+def apply_filters(year, products, regions):
+    # El índice resuelve el año; los isin solo recorren esa rebanada
+    f = df.loc[[year]]
+    return f[f['Producto'].isin(products) & f['Región'].isin(regions)]
+
+@st.cache_data
+def to_csv_bytes(year, products, regions):
+    return apply_filters(year, products, regions).to_csv(index=False).encode('utf-8')
+
+# Una sola pasada de agregación sobre el frame filtrado: los KPIs, el pie
+# por producto y la serie mensual se derivan de este índice pequeño en
+# lugar de re-escanear las filas una vez por agregado
+@st.cache_data
+def filtered_agg(year, products, regions):
+    f = apply_filters(year, products, regions)
+    return f.groupby(
+        ['Producto', 'Región', 'Mes'], observed=True
+    )['Ventas'].agg(['sum', 'count'])
+
+@st.cache_data
+def kpis(year, products, regions):
+    agg = filtered_agg(year, products, regions)
+    total = agg['sum'].sum()
+    n = agg['count'].sum()
+    avg = total / n if n else float('nan')
+    product_sales = agg['sum'].rename('Ventas').groupby(level='Producto', observed=True).sum()
+    return total, avg, product_sales
+
+# Figuras memoizadas por selección: los reruns con la misma selección
+# reutilizan el objeto en lugar de reconstruir y reenviar la figura
+@st.cache_resource
+def time_figure(level, year, products, regions):
+    if level == 'Mes':
+        # Mes está en el índice del agregado; los demás niveles
+        # (Trimestre, DíaSemana, Año) requieren las filas filtradas
+        time_df = filtered_agg(year, products, regions)['sum'].rename(
+            'Ventas'
+        ).groupby(level='Mes', observed=True).sum().reset_index()
+    else:
+        time_df = apply_filters(year, products, regions).groupby(
+            level, observed=True
+        )['Ventas'].sum().reset_index()
+    fig = px.bar(
+        time_df,
+        x=level,
+        y='Ventas',
+        title=f"Ventas por {level} (Click para drill-down)"
+    )
+    if level == 'Trimestre':
+        fig.update_xaxes(tickvals=[1, 2, 3, 4], ticktext=['T1', 'T2', 'T3', 'T4'])
+    return fig
+
+@st.cache_resource
+def product_pie(year, products, regions):
+    _, _, product_sales = kpis(year, products, regions)
+    return px.pie(
+        product_sales.reset_index(),
+        names='Producto',
+        values='Ventas',
+        hole=0.3
+    )
 
 # Sidebar con controles OLAP
 st.sidebar.header("Controles OLAP - CSV")
@@ -44,44 +185,42 @@ st.sidebar.header("Controles OLAP - CSV")
 # Operación SLICE: Filtro por año
 selected_year = st.sidebar.selectbox(
     'Seleccionar Año',
-    options=sorted(df['Año'].unique(), reverse=True)
+    options=meta['years']
 )
 
 # Operación DICE: Filtros múltiples
 selected_products = st.sidebar.multiselect(
     'Seleccionar Productos',
-    options=df['Producto'].unique(),
-    default=df['Producto'].unique()
+    options=meta['products'],
+    default=meta['products']
 )
 
 selected_regions = st.sidebar.multiselect(
     'Seleccionar Regiones',
-    options=df['Región'].unique(),
-    default=df['Región'].unique()
+    options=meta['regions'],
+    default=meta['regions']
 )
 
-# Aplicar filtros
-filtered_df = df[
-    (df['Año'] == selected_year) &
-    (df['Producto'].isin(selected_products)) &
-    (df['Región'].isin(selected_regions))
-]
+# Aplicar filtros (tuplas ordenadas para que la clave de caché sea estable)
+products_key = tuple(sorted(selected_products))
+regions_key = tuple(sorted(selected_regions))
+filtered_df = apply_filters(selected_year, products_key, regions_key)
 
 # Main Dashboard
 st.title("Análisis OLAP desde CSV")
 
 # KPIs en tarjetas
+total_sales, avg_sales, product_sales = kpis(selected_year, products_key, regions_key)
+
 col1, col2, col3 = st.columns(3)
 with col1:
-    total_sales = filtered_df['Ventas'].sum()
     st.metric("Ventas Totales", f"${total_sales:,.0f}")
 
 with col2:
-    avg_sales = filtered_df['Ventas'].mean()
     st.metric("Ventas Promedio", f"${avg_sales:,.2f}")
 
 with col3:
-    prev_year_sales = df[df['Año'] == selected_year-1]['Ventas'].sum()
+    prev_year_sales = cubes['year'].get(selected_year-1, 0)
     growth = ((total_sales / prev_year_sales) - 1)*100 if prev_year_sales != 0 else 0
     st.metric("Crecimiento Anual", f"{growth:.1f}%", 
               delta_color="inverse" if growth < 0 else "normal")
@@ -94,13 +233,7 @@ time_level = st.radio(
     horizontal=True
 )
 
-time_df = filtered_df.groupby(time_level)['Ventas'].sum().reset_index()
-fig1 = px.bar(
-    time_df, 
-    x=time_level, 
-    y='Ventas',
-    title=f"Ventas por {time_level} (Click para drill-down)"
-)
+fig1 = time_figure(time_level, selected_year, products_key, regions_key)
 st.plotly_chart(fig1, use_container_width=True)
 
 # Visualización 2: Matriz OLAP
@@ -108,14 +241,13 @@ st.header("Matriz Multidimensional")
 pivot_rows = st.selectbox("Filas:", ['Producto', 'Región'])
 pivot_cols = st.selectbox("Columnas:", ['Región', 'Producto', 'Trimestre'])
 
-pivot_table = pd.pivot_table(
-    filtered_df,
-    values='Ventas',
-    index=pivot_rows,
-    columns=pivot_cols,
-    aggfunc='sum',
-    fill_value=0
-)
+# groupby + unstack es más rápido que pivot_table y observed=True evita
+# materializar el producto cruzado de combinaciones categóricas ausentes
+pivot_table = filtered_df.groupby(
+    [pivot_rows, pivot_cols], observed=True
+)['Ventas'].sum().unstack(fill_value=0)
+if pivot_cols == 'Trimestre':
+    pivot_table.columns = [f'T{c}' for c in pivot_table.columns]
 
 st.dataframe(
     pivot_table.style.background_gradient(cmap='Blues'),
@@ -124,18 +256,13 @@ st.dataframe(
 
 # Visualización 3: Análisis por producto
 st.header("Distribución por Producto")
-fig2 = px.pie(
-    filtered_df.groupby('Producto')['Ventas'].sum().reset_index(),
-    names='Producto',
-    values='Ventas',
-    hole=0.3
-)
+fig2 = product_pie(selected_year, products_key, regions_key)
 st.plotly_chart(fig2, use_container_width=True)
 
 # Descarga de datos filtrados
 st.sidebar.download_button(
     "Descargar Datos Filtrados",
-    data=filtered_df.to_csv(index=False).encode('utf-8'),
+    data=to_csv_bytes(selected_year, products_key, regions_key),
     file_name=f"ventas_filtradas_{selected_year}.csv",
     mime='text/csv'
 )
\ No newline at end of file